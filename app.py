@@ -1,8 +1,31 @@
+import functools
 import streamlit as st
 import requests
+import numpy as np
 import pandas as pd
 import pycountry
-from urllib.parse import quote_plus
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from requests.adapters import HTTPAdapter
+from urllib.parse import quote_plus, urlencode
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import requests_cache
+except ImportError:  # pragma: no cover - optional speedup
+    requests_cache = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pragma: no cover - optional speedup
+    pa = None
 
 st.set_page_config(page_title="FDA Manufacturer Finder", layout="wide")
 
@@ -11,6 +34,34 @@ REG_LISTING_ENDPOINT = f"{OPENFDA_BASE}/device/registrationlisting.json"
 CLASS_ENDPOINT = f"{OPENFDA_BASE}/device/classification.json"
 MAUDE_ENDPOINT = f"{OPENFDA_BASE}/device/event.json"
 
+MAX_FETCH_WORKERS = 8  # concurrent page requests per fetch; keep under openFDA rate limits
+
+@st.cache_resource(show_spinner=False)
+def get_http_session() -> requests.Session:
+    """Shared pooled HTTP client — one instance across all user sessions."""
+    # SQLite-backed HTTP cache: identical openFDA URLs replay from disk
+    # across restarts and sessions, with a TTL that fits the dataset cadence.
+    if requests_cache is not None:
+        s = requests_cache.CachedSession(
+            "openfda_cache", backend="sqlite",
+            expire_after=timedelta(hours=6), allowable_codes=(200,),
+        )
+    else:
+        s = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=MAX_FETCH_WORKERS,
+        pool_maxsize=MAX_FETCH_WORKERS,
+        max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504]),
+    )
+    s.mount("https://", adapter)
+    return s
+
+def _parse_json(r: requests.Response):
+    # orjson parses the raw bytes directly, skipping charset detection
+    if orjson is not None:
+        return (orjson.loads(r.content) or {}) if r.content else {}
+    return r.json() or {}
+
 # ---------- Session defaults ----------
 if "df_regs" not in st.session_state:
     st.session_state.df_regs = None
@@ -20,30 +71,38 @@ if "selected_label" not in st.session_state:
     st.session_state.selected_label = None
 
 # ---------- Helpers ----------
+@st.cache_resource(show_spinner=False)
+def get_country_index() -> dict[str, str]:
+    return {c.name.lower(): c.alpha_2 for c in pycountry.countries}
+
+@functools.lru_cache(maxsize=512)
 def country_to_iso2(name_or_code: str) -> str | None:
     if not name_or_code:
         return None
     s = name_or_code.strip()
-    if len(s) == 2:
+    if len(s) == 2 and s.isalpha():
         return s.upper()
+    iso2 = get_country_index().get(s.lower())
+    if iso2:
+        return iso2
     try:
         return pycountry.countries.lookup(s).alpha_2
     except Exception:
         return None
 
-@st.cache_data(show_spinner=False)
+@st.cache_data(ttl=24*3600, persist="disk", max_entries=1024, show_spinner=False)
 def lookup_product_codes_by_name(q: str, limit=50):
     query = f"search=device_name:{quote_plus(q)}&limit={limit}"
     url = f"{CLASS_ENDPOINT}?{query}"
-    r = requests.get(url, timeout=30)
+    r = get_http_session().get(url, timeout=30)
     if r.status_code != 200:
         return []
-    data = r.json()
+    data = _parse_json(r)
     results = data.get("results", [])
     codes = sorted({rec.get("product_code") for rec in results if rec.get("product_code")})
     return codes
 
-def build_reglisting_search(iso2: str, product_codes: list[str]) -> str:
+def build_reglisting_search(iso2: str, product_codes: tuple[str, ...] | list[str]) -> str:
     """
     Country AND (code1 OR code2 OR ...)
     Use .exact for product codes so 3-letter codes match precisely.
@@ -56,126 +115,238 @@ def build_reglisting_search(iso2: str, product_codes: list[str]) -> str:
     if len(pcs) == 1:
         parts.append(f"products.product_code.exact:{pcs[0]}")
     elif len(pcs) > 1:
-        or_group = "+OR+".join([f"products.product_code.exact:{pc}" for pc in pcs])
-        parts.append(f"({or_group})")
+        # Lucene OR within parens — one grouped term instead of repeating the field per code
+        parts.append("products.product_code.exact:(" + "+".join(pcs) + ")")
 
     return "+".join(parts) if parts else ""
 
-@st.cache_data(show_spinner=True)
-def fetch_reglisting(iso2: str, product_codes: list[str], max_records=2000):
-    rows, limit, skip, fetched = [], 1000, 0, 0
-    search = build_reglisting_search(iso2, product_codes)
+def _fetch_page(endpoint: str, search: str, limit: int, skip: int) -> list[dict]:
+    params = {"search": search, "limit": limit, "skip": skip} if search else {"limit": limit, "skip": skip}
+    r = get_http_session().get(endpoint, params=params, timeout=60)
+    if r.status_code != 200:
+        return []
+    payload = _parse_json(r)
+    return payload.get("results", [])
 
-    while fetched < max_records:
-        params = {"search": search, "limit": limit, "skip": skip} if search else {"limit": limit, "skip": skip}
-        r = requests.get(REG_LISTING_ENDPOINT, params=params, timeout=60)
-        if r.status_code != 200:
-            break
-        payload = r.json() or {}
-        results = payload.get("results", [])
-        if not results:
-            break
-        rows.extend(results)
-        n = len(results)
-        fetched += n
-        if n < limit:
-            break
-        skip += n
-    return rows
+def _fetch_pages(endpoint: str, search: str, max_records: int, limit: int = 1000) -> list[dict]:
+    """
+    Fetch up to max_records results from an openFDA endpoint.
+    The first page reveals meta.results.total, so the remaining (skip, limit)
+    pages are known up front and fetched concurrently instead of in sequence.
+    """
+    params = {"search": search, "limit": limit} if search else {"limit": limit}
+    r = get_http_session().get(endpoint, params=params, timeout=60)
+    if r.status_code != 200:
+        return []
+    payload = _parse_json(r)
+    rows = list(payload.get("results", []))
+    if not rows:
+        return rows
+
+    total = ((payload.get("meta") or {}).get("results") or {}).get("total") or len(rows)
+    target = min(max_records, total)
+    if len(rows) >= target:
+        return rows[:target]
+
+    skips = range(limit, target, limit)
+    if skips:
+        with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as pool:
+            for page in pool.map(lambda s: _fetch_page(endpoint, search, limit, s), skips):
+                rows.extend(page)
+    return rows[:target]
+
+@st.cache_data(ttl=6*3600, persist="disk", max_entries=128, show_spinner=True)
+def fetch_reglisting(iso2: str, product_codes: tuple[str, ...], max_records=2000):
+    search = build_reglisting_search(iso2, product_codes)
+    return _fetch_pages(REG_LISTING_ENDPOINT, search, max_records)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def df_to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """CSV bytes for st.download_button — Arrow writes straight from columnar
+    buffers, skipping the str-then-encode double pass of df.to_csv().
+    Cached because Streamlit re-executes the download_button data arg on
+    every rerun whether or not the user ever clicks it."""
+    if pa is not None:
+        try:
+            sink = pa.BufferOutputStream()
+            pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), sink)
+            return sink.getvalue().to_pybytes()
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass  # nested object columns fall back to pandas
+    return df.to_csv(index=False).encode("utf-8")
 
 def normalize_reglisting_rows(rows: list[dict]) -> pd.DataFrame:
-    records = []
-    for r in rows:
+    # Column-oriented build: append straight into per-column lists so pandas
+    # materializes each column in one shot, instead of one dict per row.
+    cols = {
+        "FEI": [],
+        "Firm Name": [],
+        "City": [],
+        "State/Prov": [],
+        "Country": [],
+        "Establishment Types": [],
+        "Product Codes": [],
+    }
+    # First pass: group rows by FEI so a firm that appears once per product
+    # contributes all of its product codes to a single output row.
+    grouped = {}
+    order = []
+    for i, r in enumerate(rows):
         reg = r.get("registration", {}) or {}
-        products = r.get("products", []) or []
-        product_codes_join = ", ".join(sorted({p.get("product_code","") for p in products if p.get("product_code")}))
-        est_types = r.get("establishment_type")
+        key = reg.get("fei_number") or f"_row{i}"
+        entry = grouped.get(key)
+        if entry is None:
+            grouped[key] = entry = {
+                "reg": reg,
+                "products": [],
+                "est_types": r.get("establishment_type"),
+            }
+            order.append(key)
+        entry["products"].extend(r.get("products", []) or [])
+
+    for key in order:
+        entry = grouped[key]
+        reg = entry["reg"]
+        seen_codes = set()
+        codes = []
+        for p in entry["products"]:
+            pc = p.get("product_code")
+            if pc and pc not in seen_codes:
+                seen_codes.add(pc)
+                codes.append(pc)
+        codes.sort()
+        product_codes_join = ", ".join(codes)
+        est_types = entry["est_types"]
         if isinstance(est_types, list):
             est_types = ", ".join(sorted(set(est_types)))
-        records.append({
-            "FEI": reg.get("fei_number"),
-            "Firm Name": reg.get("name"),
-            "City": reg.get("city"),
-            "State/Prov": reg.get("state_code") or reg.get("state_province"),
-            "Country": reg.get("iso_country_code"),
-            "Establishment Types": est_types,
-            "Product Codes": product_codes_join,
-        })
-    df = pd.DataFrame.from_records(records).drop_duplicates()
-    df["Firm Label"] = df.apply(
-        lambda x: f'{x["Firm Name"]} — {x["City"] or ""} {x["State/Prov"] or ""} ({x["Country"]})',
-        axis=1
+        cols["FEI"].append(reg.get("fei_number"))
+        cols["Firm Name"].append(reg.get("name"))
+        cols["City"].append(reg.get("city"))
+        cols["State/Prov"].append(reg.get("state_code") or reg.get("state_province"))
+        cols["Country"].append(reg.get("iso_country_code"))
+        cols["Establishment Types"].append(est_types)
+        cols["Product Codes"].append(product_codes_join)
+    df = pd.DataFrame(cols, copy=False)
+    df["Firm Label"] = (
+        df["Firm Name"].fillna("") + " — " + df["City"].fillna("") + " "
+        + df["State/Prov"].fillna("") + " (" + df["Country"].fillna("") + ")"
     )
     return df
 
 # ----- MAUDE (last 18 months) -----
-def last_18_month_window() -> tuple[pd.Timestamp, pd.Timestamp, pd.PeriodIndex]:
-    today = pd.Timestamp.today().normalize()
+@functools.lru_cache(maxsize=2)
+def _month_window(date_key: str) -> tuple[pd.Timestamp, pd.Timestamp, pd.PeriodIndex]:
+    today = pd.Timestamp(date_key)
     months = pd.period_range(end=today.to_period("M"), periods=18, freq="M")
     start_date = months[0].to_timestamp(how="start")
     end_date = months[-1].to_timestamp(how="end")
     return start_date, end_date, months
 
-def build_maude_queries(firm_name: str, start_date: pd.Timestamp, end_date: pd.Timestamp) -> list[str]:
+def last_18_month_window() -> tuple[pd.Timestamp, pd.Timestamp, pd.PeriodIndex]:
+    # Keyed on the calendar day so the window is computed once per day,
+    # not three times per MAUDE render.
+    return _month_window(pd.Timestamp.today().strftime("%Y-%m-%d"))
+
+# Fields worth keeping from a MAUDE event — the raw records carry dozens of
+# columns and large narrative blobs (mdr_text) we never display or export.
+MAUDE_TOP_FIELDS = (
+    "mdr_report_key", "date_received", "event_type", "adverse_event_flag",
+    "product_problem_flag", "product_problems", "manufacturer_name",
+    "reporter_occupation_code",
+)
+MAUDE_DEVICE_FIELDS = ("brand_name", "generic_name", "manufacturer_d_name", "product_code")
+
+def _slim_maude_records(results: list[dict]) -> list[dict]:
+    slim = []
+    for r in results:
+        rec = {k: r.get(k) for k in MAUDE_TOP_FIELDS}
+        device = (r.get("device") or [{}])[0] or {}
+        rec["device"] = {k: device.get(k) for k in MAUDE_DEVICE_FIELDS}
+        slim.append(rec)
+    return slim
+
+def build_maude_query(firm_name: str, start_date: pd.Timestamp, end_date: pd.Timestamp) -> str:
     date_clause = f'date_received:[{start_date:%Y%m%d}+TO+{end_date:%Y%m%d}]'
-    # Two avenues (either can match depending on record)
-    a = f'manufacturer_name:"{firm_name}"+{date_clause}'
-    b = f'device.manufacturer_d_name:"{firm_name}"+{date_clause}'
-    return [a, b]
+    # Both naming avenues OR'd into one query (either can match depending on record)
+    return (f'(manufacturer_name:"{firm_name}"+OR+device.manufacturer_d_name:"{firm_name}")'
+            f'+AND+{date_clause}')
 
-@st.cache_data(show_spinner=True)
+@st.cache_data(ttl=6*3600, persist="disk", max_entries=128, show_spinner=True)
 def fetch_maude_events_18m(firm_name: str, max_records: int = 5000) -> tuple[pd.DataFrame, list[str]]:
     start_date, end_date, _ = last_18_month_window()
-    queries = build_maude_queries(firm_name, start_date, end_date)
-
-    frames = []
-    limit = 1000
-    preview_urls = []
-    for q in queries:
-        fetched = 0
-        skip = 0
-        while fetched < max_records:
-            params = {"search": q, "limit": limit, "skip": skip}
-            prepared = requests.Request("GET", MAUDE_ENDPOINT, params=params).prepare().url
-            if skip == 0:  # only show first page per query in preview
-                preview_urls.append(prepared)
-            r = requests.get(MAUDE_ENDPOINT, params=params, timeout=60)
-            if r.status_code != 200:
-                break
-            payload = r.json() or {}
-            results = payload.get("results", [])
-            if not results:
-                break
-            frames.append(pd.json_normalize(results))
-            n = len(results)
-            fetched += n
-            if n < limit:
-                break
-            skip += n
-
-    if not frames:
+    q = build_maude_query(firm_name, start_date, end_date)
+
+    # only show the first page in preview
+    preview_urls = [
+        f"{MAUDE_ENDPOINT}?{urlencode({'search': q, 'limit': 1000, 'skip': 0}, quote_via=quote_plus)}"
+    ]
+    results = _fetch_pages(MAUDE_ENDPOINT, q, max_records)
+
+    if not results:
         return pd.DataFrame(columns=["date_received"]), preview_urls
-    df = pd.concat(frames, ignore_index=True)
-    if "date_received" not in df.columns:
-        df["date_received"] = pd.Series(dtype="object")
+    df = pd.json_normalize(_slim_maude_records(results))
+    # mdr_report_key is MAUDE's natural key; guard against pagination overlap
+    df = df[~df["mdr_report_key"].duplicated() | df["mdr_report_key"].isna()].reset_index(drop=True)
+    # Parse dates once here, inside the cached call — rerenders then reuse
+    # the datetime64 column instead of re-parsing 5k strings per rerun.
+    if "date_received" in df.columns:
+        df["date_received"] = pd.to_datetime(df["date_received"], format="%Y%m%d",
+                                             errors="coerce", cache=True)
+    else:
+        df["date_received"] = pd.Series(dtype="datetime64[ns]")
+    # Highly repetitive code/flag columns: category cuts the per-row string
+    # refs to small integer codes and speeds downstream value_counts/groupby.
+    cat_cols = [
+        c for c in ("event_type", "adverse_event_flag", "product_problem_flag",
+                    "reporter_occupation_code", "manufacturer_name",
+                    "device.manufacturer_d_name", "device.product_code")
+        if c in df.columns
+    ]
+    df[cat_cols] = df[cat_cols].astype("category")
     return df, preview_urls
 
-def maude_monthly_counts_18m(df: pd.DataFrame) -> pd.DataFrame:
+def _fetch_maude_count(q: str) -> Counter:
+    r = get_http_session().get(MAUDE_ENDPOINT, params={"search": q, "count": "date_received"}, timeout=60)
+    if r.status_code != 200:
+        return Counter()
+    results = _parse_json(r).get("results", [])
+    # results are {"time": "YYYYMMDD", "count": N}; bucket to months
+    counter = Counter()
+    for rec in results:
+        t = rec.get("time", "")
+        if len(t) == 8:
+            counter[t[:6]] += rec.get("count", 0)
+    return counter
+
+@st.cache_data(ttl=6*3600, persist="disk", max_entries=128, show_spinner=False)
+def fetch_maude_monthly_counts_18m(firm_name: str) -> pd.DataFrame | None:
+    """
+    Monthly MAUDE counts via the openFDA count endpoint — the server returns
+    the whole date histogram in one small payload instead of raw event pages.
+    Returns None when the query yields no counts.
+    """
     start_date, end_date, months = last_18_month_window()
-    if df.empty:
-        return pd.DataFrame({"month_ts": months.to_timestamp(), "count": [0]*len(months)})
+    counter = _fetch_maude_count(build_maude_query(firm_name, start_date, end_date))
+    if not counter:
+        return None
 
-    dt = pd.to_datetime(df["date_received"], format="%Y%m%d", errors="coerce")
-    mask = (dt >= start_date) & (dt <= end_date)
-    dt = dt[mask]
-    if dt.empty:
-        return pd.DataFrame({"month_ts": months.to_timestamp(), "count": [0]*len(months)})
+    periods = pd.PeriodIndex([pd.Period(f"{k[:4]}-{k[4:]}", freq="M") for k in counter], freq="M")
+    counts = pd.Series(list(counter.values()), index=periods).reindex(months, fill_value=0)
+    return pd.DataFrame({"month_ts": months.to_timestamp(), "count": counts.to_numpy()})
 
-    counts = dt.dt.to_period("M").value_counts().sort_index()
-    counts = counts.reindex(months, fill_value=0)
-    out = counts.rename_axis("month").reset_index(name="count")
-    out["month_ts"] = out["month"].dt.to_timestamp()
-    return out[["month_ts", "count"]]
+def maude_monthly_counts_18m(df: pd.DataFrame) -> pd.DataFrame:
+    start_date, end_date, months = last_18_month_window()
+    if df.empty:
+        counts = np.zeros(len(months), dtype=np.int64)
+    else:
+        # Mask to the window first — a cached frame can straddle a month
+        # rollover, and out-of-category values in a Categorical are
+        # deprecated in pandas 3. NaT fails both comparisons and drops out.
+        dt = df["date_received"]  # already datetime64 from fetch_maude_events_18m
+        dt = dt[(dt >= start_date) & (dt <= end_date)]
+        codes = pd.Categorical(dt.dt.to_period("M"), categories=months, ordered=True).codes
+        counts = np.bincount(codes[codes >= 0], minlength=len(months))
+    return pd.DataFrame({"month_ts": months.to_timestamp(), "count": counts})
 
 # ---------- UI: Filters in a FORM ----------
 st.title("FDA Manufacturer Finder")
@@ -219,14 +390,24 @@ with st.sidebar:
         "pcs": ", ".join(product_codes) if mode == "Product code(s)" else st.session_state.search_params.get("pcs",""),
         "device_name": device_name if mode == "Device name" else "",
         "max_records": max_records,
+        # carry the submit-time stash across non-submit reruns
+        "resolved_codes": st.session_state.search_params.get("resolved_codes", ()),
     }
 
 # ---------- Run search only when submitted ----------
 if submitted:
     iso2 = country_to_iso2(st.session_state.search_params["country_input"]) or ""
-    pcs_for_query = ([p.strip() for p in st.session_state.search_params.get("pcs","").split(",") if p.strip()]
-                     if st.session_state.search_params["mode"] == "Product code(s)" else
-                     lookup_product_codes_by_name(st.session_state.search_params.get("device_name","")))
+    pcs_raw = (st.session_state.search_params.get("pcs","").split(",")
+               if st.session_state.search_params["mode"] == "Product code(s)" else
+               lookup_product_codes_by_name(st.session_state.search_params.get("device_name","")))
+    # Canonical cache key: sorted unique uppercase tuple, so ["fmf","DQD"]
+    # and ["DQD", "FMF"] hit the same fetch_reglisting entry.
+    pcs_for_query = tuple(sorted({p.strip().upper() for p in pcs_raw if p and p.strip()}))
+    if not iso2 and not pcs_for_query:
+        # An empty search would page through the entire device registry.
+        st.warning("Specify a country or at least one product code before searching.")
+        st.stop()
+    st.session_state.search_params["resolved_codes"] = pcs_for_query
     with st.spinner("Querying openFDA Registrations…"):
         rows = fetch_reglisting(iso2, pcs_for_query, max_records=st.session_state.search_params["max_records"])
     st.session_state.df_regs = normalize_reglisting_rows(rows) if rows else pd.DataFrame()
@@ -234,24 +415,21 @@ if submitted:
 
 # ---------- Show results ----------
 df_regs = st.session_state.df_regs
-iso2_for_preview = country_to_iso2(st.session_state.search_params.get("country_input","")) or ""
-pcs_preview = ([p.strip() for p in st.session_state.search_params.get("pcs","").split(",") if p.strip()]
-               if st.session_state.search_params.get("mode")=="Product code(s)" else
-               lookup_product_codes_by_name(st.session_state.search_params.get("device_name","")))
-reg_preview_params = {"search": build_reglisting_search(iso2_for_preview, pcs_preview), "limit": 5, "skip": 0}
-reg_preview_url = requests.Request("GET", REG_LISTING_ENDPOINT, params=reg_preview_params).prepare().url
-st.caption("Registration query preview:")
-st.code(reg_preview_url, language="text")
-
-if df_regs is None:
-    st.info("Use the sidebar to search.")
-elif df_regs.empty:
-    st.warning("No results. Try a different country or product selection.")
-else:
-    st.success(f"Found {len(df_regs):,} establishments")
-    st.dataframe(df_regs.drop(columns=["Firm Label"]), use_container_width=True)
-    st.download_button("Download CSV", df_regs.to_csv(index=False).encode("utf-8"), "fda_mfrs.csv", "text/csv")
-
+if submitted or df_regs is not None:
+    # Codes were resolved (and stashed) at submit time — no second lookup here.
+    iso2_for_preview = country_to_iso2(st.session_state.search_params.get("country_input","")) or ""
+    pcs_preview = st.session_state.search_params.get("resolved_codes", [])
+    search_preview = build_reglisting_search(iso2_for_preview, pcs_preview)
+    if search_preview:  # never show an unfiltered whole-registry URL
+        reg_preview_params = {"search": search_preview, "limit": 5, "skip": 0}
+        reg_preview_url = f"{REG_LISTING_ENDPOINT}?{urlencode(reg_preview_params, quote_via=quote_plus)}"
+        st.caption("Registration query preview:")
+        st.code(reg_preview_url, language="text")
+
+@st.fragment
+def maude_drilldown(df_regs: pd.DataFrame):
+    # Fragment: changing the manufacturer only reruns this block, not the
+    # whole script (sidebar, preview URL, registration rendering).
     st.subheader("MAUDE for selected supplier (last 18 months)")
     labels = df_regs["Firm Label"].tolist()
     default_index = labels.index(st.session_state.selected_label) if st.session_state.selected_label in labels else 0
@@ -259,7 +437,12 @@ else:
 
     if selected_label:
         sel_row = df_regs[df_regs["Firm Label"] == selected_label].iloc[0]
-        firm_name = sel_row["Firm Name"]
+        name = sel_row["Firm Name"]
+        firm_name = "" if pd.isna(name) else str(name).strip()
+        if not firm_name:
+            # Registration had no firm name — querying manufacturer_name:"" is junk
+            st.warning("This establishment has no firm name on file; cannot look up MAUDE events.")
+            return
         st.caption(f"MAUDE for **{firm_name}** — last 18 months")
 
         try:
@@ -270,14 +453,27 @@ else:
             for url in maude_preview_urls:
                 st.code(url, language="text")
 
-            monthly = maude_monthly_counts_18m(df_maude)
+            monthly = fetch_maude_monthly_counts_18m(firm_name)
+            if monthly is None:
+                monthly = maude_monthly_counts_18m(df_maude)
             st.line_chart(monthly.set_index("month_ts")["count"], height=300)
             st.dataframe(df_maude, use_container_width=True)
             st.download_button(
                 "Download MAUDE CSV (last 18 months)",
-                df_maude.to_csv(index=False).encode("utf-8"),
+                df_to_csv_bytes(df_maude),
                 "maude_18m.csv",
                 "text/csv"
             )
         except Exception as e:
             st.error(f"MAUDE lookup failed: {e}")
+
+if df_regs is None:
+    st.info("Use the sidebar to search.")
+elif df_regs.empty:
+    st.warning("No results. Try a different country or product selection.")
+else:
+    st.success(f"Found {len(df_regs):,} establishments")
+    st.dataframe(df_regs.drop(columns=["Firm Label"]), use_container_width=True)
+    st.download_button("Download CSV", df_to_csv_bytes(df_regs), "fda_mfrs.csv", "text/csv")
+
+    maude_drilldown(df_regs)